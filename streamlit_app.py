@@ -1,10 +1,14 @@
+import io
+import time
+
 import streamlit as st
 import pandas as pd
 import numpy as np
-from PIL import Image, ImageDraw
-from streamlit_drawable_canvas import st_canvas
-import matplotlib.pyplot as plt
-import time
+from PIL import Image
+
+# matplotlib, streamlit_drawable_canvas and PIL.ImageDraw are imported lazily
+# in the code paths that use them, so pages that never plot or draw don't pay
+# their import cost.
 
 # --- Page Configuration ---
 st.set_page_config(layout="wide", page_title="BioVision Analytics")
@@ -20,19 +24,145 @@ if 'generated_data' not in st.session_state:
 
 # --- DYNAMIC CLASS STATE ---
 if 'classes' not in st.session_state:
-    st.session_state.classes = [
-        {"name": "Nuclei", "color": "#0000FF"},      # Blue
-        {"name": "Cytoplasm", "color": "#FFFF00"},   # Yellow
-        {"name": "Background", "color": "#FF0000"}   # Red
-    ]
+    st.session_state.classes = {
+        "Nuclei": "#0000FF",      # Blue
+        "Cytoplasm": "#FFFF00",   # Yellow
+        "Background": "#FF0000"   # Red
+    }
+
+# --- Static Data ---
+# Mock marketplace catalog with specific cell images. Built once at import so
+# reruns don't reconstruct the literals on every keystroke in the search box.
+_ALL_MARKET_MODELS = (
+    {
+        "name": "H&E Histology Segmenter",
+        "tags": "#Tissue #H&E",
+        "stars": "⭐⭐⭐⭐⭐",
+        "img": "https://images.unsplash.com/photo-1576086213369-97a306d36557?auto=format&fit=crop&w=400&q=80"
+    },
+    {
+        "name": "Fluorescent Nuclei (DAPI)",
+        "tags": "#Nuclei #Fluorescence",
+        "stars": "⭐⭐⭐⭐",
+        "img": "https://images.unsplash.com/photo-1532187863486-abf9dbad1b69?auto=format&fit=crop&w=400&q=80"
+    },
+    {
+        "name": "Stem Cell Colony Tracker",
+        "tags": "#LiveCell #PhaseContrast",
+        "stars": "⭐⭐⭐⭐⭐",
+        "img": "https://images.unsplash.com/photo-1579154204601-01588f351e67?auto=format&fit=crop&w=400&q=80"
+    },
+    {
+        "name": "Bacteria/Microbe Counter",
+        "tags": "#Microbiology #100x",
+        "stars": "⭐⭐⭐",
+        "img": "https://images.unsplash.com/photo-1581093450021-4a7360e9a6b5?auto=format&fit=crop&w=400&q=80"
+    },
+)
+
+# Lowercase haystacks precomputed once so search doesn't call .lower() on
+# every model for every keystroke.
+_MARKET_INDEX = [(m, (m['name'] + ' ' + m['tags']).lower()) for m in _ALL_MARKET_MODELS]
+
+# Explicit column types for the Batch Runner results table, so Arrow skips
+# schema inference when serializing the DataFrame.
+_RESULT_COLS = {
+    "Filename": st.column_config.TextColumn(),
+    "Cell_Count": st.column_config.NumberColumn(format="%d"),
+    "Avg_Intensity": st.column_config.NumberColumn(format="%.3f"),
+}
 
 # --- Helper Functions ---
-def mock_predict_image(image, brush_data):
-    img_array = np.array(image)
-    mask = np.zeros_like(img_array)
-    mask[:, :, 0] = 100 
+@st.cache_data(show_spinner=False)
+def _load_bg(file_id: str, _upload) -> Image.Image:
+    """Decode an uploaded image and resize it for the canvas, once per upload.
+
+    Keyed on the upload's file_id; the underscore arg is excluded from
+    Streamlit's hash so cache lookups don't walk the whole byte buffer.
+    """
+    im = Image.open(_upload)
+    # For JPEGs this tells libjpeg to decode at a reduced DCT scale close to
+    # the target size; it is a no-op for PNG/TIFF.
+    im.draft('RGB', (600, 400))
+    return im.convert("RGB").resize((600, 400), Image.BILINEAR)
+
+
+def _remove_class(name: str) -> None:
+    st.session_state.classes.pop(name, None)
+
+
+def _add_class() -> None:
+    name = st.session_state.new_class_name
+    if name in st.session_state.classes:
+        st.session_state.class_error = "Class already exists!"
+    else:
+        st.session_state.classes[name] = st.session_state.new_class_color
+        st.session_state.class_error = None
+
+
+@st.cache_resource
+def _placeholder() -> Image.Image:
+    """Build the no-upload canvas background once per process."""
+    from PIL import ImageDraw
+
+    im = Image.new('RGB', (600, 400), color=(73, 109, 137))
+    ImageDraw.Draw(im).text((250, 200), "Upload an Image", fill=(255, 255, 0))
+    return im
+
+
+@st.cache_data(show_spinner=False)
+def _preview_jpeg(key: str, _image: Image.Image) -> bytes:
+    """JPEG bytes for the Validation preview, encoded once per background."""
+    buf = io.BytesIO()
+    _image.save(buf, 'JPEG', quality=85)
+    return buf.getvalue()
+
+
+@st.cache_data(show_spinner=False)
+def _build_results(names: tuple, seed: int) -> pd.DataFrame:
+    """Mock batch results; cached so the same batch reuses its Arrow table."""
+    n = len(names)
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Filename": list(names),
+        "Cell_Count": rng.integers(50, 200, n),
+        "Avg_Intensity": rng.uniform(0.2, 0.9, n),
+    })
+
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def _thumb(url: str) -> bytes:
+    """Fetch a marketplace image and downscale it to grid-cell size, once per URL."""
+    import requests
+
+    im = Image.open(io.BytesIO(requests.get(url, timeout=5).content))
+    im.thumbnail((200, 200), Image.LANCZOS)
+    buf = io.BytesIO()
+    im.convert("RGB").save(buf, 'JPEG', quality=78)
+    return buf.getvalue()
+
+
+@st.cache_resource
+def _lab_fig():
+    """One Figure/Axes pair reused across Analysis Lab reruns."""
+    import matplotlib.pyplot as plt
+
+    return plt.subplots()
+
+
+@st.cache_data(show_spinner=False)
+def _const_mask(w: int, h: int) -> Image.Image:
+    mask = np.empty((h, w, 3), np.uint8)
+    mask[..., 0] = 100
+    mask[..., 1:] = 0
     return Image.fromarray(mask)
 
+
+def mock_predict_image(image, brush_data):
+    # Placeholder prediction: a constant mask, memoized per image size.
+    # A real per-pixel kernel can slot in here later.
+    return _const_mask(*image.size)
+
 # --- Navigation ---
 st.sidebar.title("🧬 VolkCell Analytics")
 page = st.sidebar.radio("Navigation", ["Model Studio", "Batch Runner", "Marketplace", "Analysis Lab"])
@@ -41,6 +171,8 @@ page = st.sidebar.radio("Navigation", ["Model Studio", "Batch Runner", "Marketpl
 # 1. MODEL STUDIO
 # ==========================================
 if page == "Model Studio":
+    from streamlit_drawable_canvas import st_canvas
+
     st.title("🖌️ Model Studio")
     st.markdown("Paint on the image to train your classifier. The model learns in real-time.")
 
@@ -50,20 +182,17 @@ if page == "Model Studio":
         st.subheader("Palette")
         
         # Class Selection
-        class_options = [c['name'] for c in st.session_state.classes]
-        
+        class_options = list(st.session_state.classes)
+
         if class_options:
             selected_class_name = st.radio("Active Class", class_options)
-            
+
             # Find color
-            selected_class = next((c for c in st.session_state.classes if c['name'] == selected_class_name), None)
-            stroke_color = selected_class['color'] if selected_class else "#FFFFFF"
-            
+            stroke_color = st.session_state.classes.get(selected_class_name, "#FFFFFF")
+
             st.caption(f"Color: {stroke_color}")
-            
-            if st.button(f"🗑️ Remove '{selected_class_name}'"):
-                st.session_state.classes = [c for c in st.session_state.classes if c['name'] != selected_class_name]
-                st.rerun()
+
+            st.button(f"🗑️ Remove '{selected_class_name}'", on_click=_remove_class, args=(selected_class_name,))
         else:
             st.warning("No classes defined. Add one below.")
             stroke_color = "#FFFFFF"
@@ -72,18 +201,19 @@ if page == "Model Studio":
         
         # Add New Class
         with st.expander("➕ Add New Class", expanded=False):
-            new_name = st.text_input("Class Name", "Mitochondria")
-            new_color = st.color_picker("Class Color", "#00FF00")
-            
-            if st.button("Add Class"):
-                if any(c['name'] == new_name for c in st.session_state.classes):
-                    st.error("Class already exists!")
-                else:
-                    st.session_state.classes.append({"name": new_name, "color": new_color})
-                    st.rerun()
+            st.text_input("Class Name", "Mitochondria", key="new_class_name")
+            st.color_picker("Class Color", "#00FF00", key="new_class_color")
+
+            st.button("Add Class", on_click=_add_class)
+            if st.session_state.get("class_error"):
+                st.error(st.session_state.class_error)
 
         st.markdown("---")
-        brush_size = st.slider("Brush Size", 1, 50, 10)
+        # Deferred behind a form submit: every slider tick would otherwise
+        # rerun the script and make the canvas re-ship its background image.
+        with st.form("palette_form"):
+            brush_size = st.slider("Brush Size", 1, 50, 10)
+            st.form_submit_button("Apply")
         
         if st.button("Train Model"):
             with st.spinner("Updating weights..."):
@@ -96,12 +226,10 @@ if page == "Model Studio":
         
         # Prepare background image for display
         if upload_img:
-            bg_image = Image.open(upload_img).resize((600, 400))
+            bg_image = _load_bg(upload_img.file_id, upload_img)
             bg_for_canvas = bg_image
         else:
-            bg_image = Image.new('RGB', (600, 400), color = (73, 109, 137))
-            d = ImageDraw.Draw(bg_image)
-            d.text((250,200), "Upload an Image", fill=(255,255,0))
+            bg_image = _placeholder()
             bg_for_canvas = bg_image
 
         # Canvas - pass PIL Image or None
@@ -110,7 +238,7 @@ if page == "Model Studio":
             stroke_width=brush_size,
             stroke_color=stroke_color,
             background_color="" if upload_img else "#496D89",  # Empty string when image exists
-            background_image=Image.open(upload_img) if upload_img else None,
+            background_image=bg_for_canvas if upload_img else None,
             update_streamlit=True,
             height=400,
             width=600,
@@ -120,7 +248,8 @@ if page == "Model Studio":
 
     with col3:
         st.subheader("Validation")
-        st.image(bg_image, caption="Live Prediction")
+        preview_key = upload_img.file_id if upload_img else "placeholder"
+        st.image(_preview_jpeg(preview_key, bg_image), caption="Live Prediction")
         
         st.metric("Model Confidence", "88%", "+12%")
         
@@ -155,23 +284,14 @@ elif page == "Batch Runner":
             st.warning("Please upload files first.")
         else:
             progress_bar = st.progress(0)
-            data_rows = []
-            for i, file in enumerate(uploaded_files):
-                time.sleep(0.5) 
-                progress_bar.progress((i + 1) / len(uploaded_files))
-                
-                data_rows.append({
-                    "Filename": file.name,
-                    "Cell_Count": np.random.randint(50, 200),
-                    "Avg_Intensity": np.random.uniform(0.2, 0.9),
-                })
-            
-            st.session_state.generated_data = pd.DataFrame(data_rows)
+            names = tuple(f.name for f in uploaded_files)
+            st.session_state.generated_data = _build_results(names, seed=0)
+            progress_bar.progress(1.0)
             st.success("Done!")
 
     if st.session_state.generated_data is not None:
         st.subheader("Results")
-        st.dataframe(st.session_state.generated_data)
+        st.dataframe(st.session_state.generated_data, height=400, column_config=_RESULT_COLS)
 
 # ==========================================
 # 3. MARKETPLACE
@@ -188,38 +308,17 @@ elif page == "Marketplace":
     
     st.markdown("---")
 
-    # Mock Data with Specific Cell Images
-    all_market_models = [
-        {
-            "name": "H&E Histology Segmenter", 
-            "tags": "#Tissue #H&E", 
-            "stars": "⭐⭐⭐⭐⭐",
-            "img": "https://images.unsplash.com/photo-1576086213369-97a306d36557?auto=format&fit=crop&w=400&q=80"
-        },
-        {
-            "name": "Fluorescent Nuclei (DAPI)", 
-            "tags": "#Nuclei #Fluorescence", 
-            "stars": "⭐⭐⭐⭐",
-            "img": "https://images.unsplash.com/photo-1532187863486-abf9dbad1b69?auto=format&fit=crop&w=400&q=80"
-        },
-        {
-            "name": "Stem Cell Colony Tracker", 
-            "tags": "#LiveCell #PhaseContrast", 
-            "stars": "⭐⭐⭐⭐⭐",
-            "img": "https://images.unsplash.com/photo-1579154204601-01588f351e67?auto=format&fit=crop&w=400&q=80"
-        },
-        {
-            "name": "Bacteria/Microbe Counter", 
-            "tags": "#Microbiology #100x", 
-            "stars": "⭐⭐⭐",
-            "img": "https://images.unsplash.com/photo-1581093450021-4a7360e9a6b5?auto=format&fit=crop&w=400&q=80"
-        },
-    ]
-
-    filtered_models = [
-        m for m in all_market_models 
-        if search_query in m['name'].lower() or search_query in m['tags'].lower()
-    ]
+    # Reuse the last filter result when the query is unchanged; reruns can be
+    # triggered by widgets other than the search box.
+    if st.session_state.get('_mkt_q') == search_query:
+        filtered_models = st.session_state['_mkt_res']
+    else:
+        if search_query:
+            filtered_models = [m for m, hay in _MARKET_INDEX if search_query in hay]
+        else:
+            filtered_models = list(_ALL_MARKET_MODELS)
+        st.session_state['_mkt_q'] = search_query
+        st.session_state['_mkt_res'] = filtered_models
 
     if not filtered_models:
         st.info("No models found matching your search.")
@@ -227,7 +326,7 @@ elif page == "Marketplace":
         cols = st.columns(4)
         for i, model in enumerate(filtered_models):
             with cols[i % 4]:
-                st.image(model['img']) 
+                st.image(_thumb(model['img']))
                 st.subheader(model['name'])
                 st.caption(model['tags'])
                 st.write(model['stars'])
@@ -256,9 +355,20 @@ elif page == "Analysis Lab":
         with c2:
             y_axis = st.selectbox("Y Axis", df.columns)
         
-        fig, ax = plt.subplots()
-        ax.scatter(df[x_axis], df[y_axis])
+        fig, ax = _lab_fig()
+        ax.clear()
+        # scatter builds one Path per point; past a few thousand rows, plain
+        # pixel markers render an order of magnitude faster.
+        if len(df) > 5000:
+            ax.plot(df[x_axis].to_numpy(), df[y_axis].to_numpy(), ',', linestyle='none')
+        else:
+            ax.scatter(df[x_axis].to_numpy(), df[y_axis].to_numpy(), s=8, rasterized=True)
         ax.set_title(f"{y_axis} vs {x_axis}")
-        st.pyplot(fig)
+
+        # Render to a fixed-size PNG rather than st.pyplot's vector path,
+        # which scales with the number of points.
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', dpi=90, bbox_inches='tight')
+        st.image(buf.getvalue())
     else:
         st.info("No data available. Run an analysis first.")